@@ -2,95 +2,271 @@
 Tests for the Mergington High School API endpoints
 """
 
+import asyncio
+import functools
+import sys
+from urllib.parse import quote, unquote, urlencode
+
+import orjson
 import pytest
-from fastapi.testclient import TestClient
-from src.app import app, activities
+import pytest_asyncio
+from fastapi import HTTPException
+from httpx import ASGITransport, AsyncClient
+from src.app import app, activities, signup_for_activity, unregister_from_activity
 
+# Interned names shared by the template and the tests, so dict lookups and
+# membership checks against activities can match on identity
+ACT_SOCCER = sys.intern("Soccer Team")
+ACT_BASKETBALL = sys.intern("Basketball Club")
+ACT_ART = sys.intern("Art Club")
+ACT_THEATER = sys.intern("Theater Group")
+ACT_DEBATE = sys.intern("Debate Team")
+ACT_SCIENCE = sys.intern("Science Olympiad")
+ACT_CHESS = sys.intern("Chess Club")
+ACT_PROGRAMMING = sys.intern("Programming Class")
+ACT_GYM = sys.intern("Gym Class")
+EMAIL_ALEX = sys.intern("alex@mergington.edu")
 
-@pytest.fixture
-def client():
-    """Create a test client for the FastAPI app"""
-    return TestClient(app)
 
+# State yielded by the app's lifespan, copied into each raw ASGI request scope
+_lifespan_state = {}
 
-@pytest.fixture(autouse=True)
-def reset_activities():
-    """Reset activities to initial state before each test"""
-    # Store original state
-    original_activities = {
-        "Soccer Team": {
-            "description": "Join the school soccer team and compete in inter-school matches",
-            "schedule": "Mondays and Wednesdays, 4:00 PM - 6:00 PM",
-            "max_participants": 25,
-            "participants": ["alex@mergington.edu", "ryan@mergington.edu"]
-        },
-        "Basketball Club": {
-            "description": "Practice basketball skills and participate in friendly matches",
-            "schedule": "Tuesdays and Thursdays, 4:00 PM - 5:30 PM",
-            "max_participants": 15,
-            "participants": ["james@mergington.edu", "sarah@mergington.edu"]
-        },
-        "Art Club": {
-            "description": "Explore various art techniques including painting, drawing, and sculpture",
-            "schedule": "Wednesdays, 3:30 PM - 5:00 PM",
-            "max_participants": 18,
-            "participants": ["lily@mergington.edu", "ava@mergington.edu"]
-        },
-        "Theater Group": {
-            "description": "Perform in plays, learn acting techniques, and stage production",
-            "schedule": "Thursdays, 3:30 PM - 5:30 PM",
-            "max_participants": 20,
-            "participants": ["noah@mergington.edu", "mia@mergington.edu"]
-        },
-        "Debate Team": {
-            "description": "Develop critical thinking and public speaking through competitive debates",
-            "schedule": "Tuesdays, 3:30 PM - 5:00 PM",
-            "max_participants": 16,
-            "participants": ["ethan@mergington.edu", "isabella@mergington.edu"]
-        },
-        "Science Olympiad": {
-            "description": "Prepare for and compete in science competitions and experiments",
-            "schedule": "Fridays, 3:30 PM - 5:30 PM",
-            "max_participants": 15,
-            "participants": ["liam@mergington.edu", "charlotte@mergington.edu"]
-        },
-        "Chess Club": {
-            "description": "Learn strategies and compete in chess tournaments",
-            "schedule": "Fridays, 3:30 PM - 5:00 PM",
-            "max_participants": 12,
-            "participants": ["michael@mergington.edu", "daniel@mergington.edu"]
-        },
-        "Programming Class": {
-            "description": "Learn programming fundamentals and build software projects",
-            "schedule": "Tuesdays and Thursdays, 3:30 PM - 4:30 PM",
-            "max_participants": 20,
-            "participants": ["emma@mergington.edu", "sophia@mergington.edu"]
-        },
-        "Gym Class": {
-            "description": "Physical education and sports activities",
-            "schedule": "Mondays, Wednesdays, Fridays, 2:00 PM - 3:00 PM",
-            "max_participants": 30,
-            "participants": ["john@mergington.edu", "olivia@mergington.edu"]
-        }
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def lifespan():
+    """Run the app's lifespan once for the whole module
+
+    Neither ``ASGITransport`` nor ``asgi_call`` sends lifespan events, so
+    startup and shutdown are driven here instead.
+    """
+    async with app.router.lifespan_context(app) as state:
+        _lifespan_state.update(state or {})
+        yield
+        _lifespan_state.clear()
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def client(lifespan):
+    """Create a single async client for the FastAPI app, shared by the module
+
+    Requests are dispatched straight into the ASGI app through
+    ``ASGITransport``, without the thread portal ``TestClient`` uses.
+    """
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+# Initial activities state, restored after each test. The participant lists
+# are kept as tuples so they cannot be mutated through a restored entry; the
+# per-activity dicts themselves are ordinary dicts.
+_TEMPLATE = {
+    ACT_SOCCER: {
+        "description": "Join the school soccer team and compete in inter-school matches",
+        "schedule": "Mondays and Wednesdays, 4:00 PM - 6:00 PM",
+        "max_participants": 25,
+        "participants": (EMAIL_ALEX, "ryan@mergington.edu")
+    },
+    ACT_BASKETBALL: {
+        "description": "Practice basketball skills and participate in friendly matches",
+        "schedule": "Tuesdays and Thursdays, 4:00 PM - 5:30 PM",
+        "max_participants": 15,
+        "participants": ("james@mergington.edu", "sarah@mergington.edu")
+    },
+    ACT_ART: {
+        "description": "Explore various art techniques including painting, drawing, and sculpture",
+        "schedule": "Wednesdays, 3:30 PM - 5:00 PM",
+        "max_participants": 18,
+        "participants": ("lily@mergington.edu", "ava@mergington.edu")
+    },
+    ACT_THEATER: {
+        "description": "Perform in plays, learn acting techniques, and stage production",
+        "schedule": "Thursdays, 3:30 PM - 5:30 PM",
+        "max_participants": 20,
+        "participants": ("noah@mergington.edu", "mia@mergington.edu")
+    },
+    ACT_DEBATE: {
+        "description": "Develop critical thinking and public speaking through competitive debates",
+        "schedule": "Tuesdays, 3:30 PM - 5:00 PM",
+        "max_participants": 16,
+        "participants": ("ethan@mergington.edu", "isabella@mergington.edu")
+    },
+    ACT_SCIENCE: {
+        "description": "Prepare for and compete in science competitions and experiments",
+        "schedule": "Fridays, 3:30 PM - 5:30 PM",
+        "max_participants": 15,
+        "participants": ("liam@mergington.edu", "charlotte@mergington.edu")
+    },
+    ACT_CHESS: {
+        "description": "Learn strategies and compete in chess tournaments",
+        "schedule": "Fridays, 3:30 PM - 5:00 PM",
+        "max_participants": 12,
+        "participants": ("michael@mergington.edu", "daniel@mergington.edu")
+    },
+    ACT_PROGRAMMING: {
+        "description": "Learn programming fundamentals and build software projects",
+        "schedule": "Tuesdays and Thursdays, 3:30 PM - 4:30 PM",
+        "max_participants": 20,
+        "participants": ("emma@mergington.edu", "sophia@mergington.edu")
+    },
+    ACT_GYM: {
+        "description": "Physical education and sports activities",
+        "schedule": "Mondays, Wednesdays, Fridays, 2:00 PM - 3:00 PM",
+        "max_participants": 30,
+        "participants": ("john@mergington.edu", "olivia@mergington.edu")
     }
-    
-    # Reset activities dictionary
+}
+
+# Percent-encoded endpoint paths for each activity, built once at import
+SIGNUP = {name: f"/activities/{quote(name)}/signup" for name in _TEMPLATE}
+UNREGISTER = {name: f"/activities/{quote(name)}/unregister" for name in _TEMPLATE}
+
+# Fields every activity entry carries
+_ACTIVITY_FIELDS = {"description", "schedule", "max_participants", "participants"}
+
+# Activities whose participants were modified since the last restore
+_touched = set()
+
+
+class _TrackedParticipants(list):
+    """Participant list that records its activity in ``_touched`` when mutated"""
+
+    def __init__(self, activity_name, emails):
+        super().__init__(emails)
+        self.activity_name = activity_name
+
+
+def _tracked(method):
+    """Wrap a mutating ``list`` method so it marks the activity as touched"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        _touched.add(self.activity_name)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+for _method in ("append", "extend", "insert", "remove", "pop", "clear",
+                "sort", "reverse", "__setitem__", "__delitem__",
+                "__iadd__", "__imul__"):
+    setattr(_TrackedParticipants, _method, _tracked(getattr(list, _method)))
+
+
+def _restore_activities(names):
+    """Rebuild the named activities from the template"""
+    for name in names:
+        details = _TEMPLATE[name]
+        activities[name] = {
+            **details, "participants": _TrackedParticipants(name, details["participants"])
+        }
+
+
+def _restore_all_activities():
+    """Replace every activity with a tracked copy of the template"""
     activities.clear()
-    activities.update(original_activities)
-    
+    _restore_activities(_TEMPLATE)
+    _touched.clear()
+
+
+def _matches_template():
+    """Return whether activities still equals the template
+
+    Catches changes the participant lists cannot record, such as a
+    replaced list, an edited field or an added or removed activity.
+    """
+    if activities.keys() != _TEMPLATE.keys():
+        return False
+    for name, details in _TEMPLATE.items():
+        activity = activities[name]
+        if (activity.keys() != _ACTIVITY_FIELDS
+                or activity["description"] != details["description"]
+                or activity["schedule"] != details["schedule"]
+                or activity["max_participants"] != details["max_participants"]
+                or not isinstance(activity["participants"], _TrackedParticipants)
+                or activity["participants"].activity_name != name
+                or tuple(activity["participants"]) != details["participants"]):
+            return False
+    return True
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tracked_activities():
+    """Replace all activities with tracked copies of the template, once per run
+
+    At the end of the run the state is checked against the template once,
+    flagging any change the per-test restores missed.
+    """
+    _restore_all_activities()
     yield
-    
-    # Cleanup after test
-    activities.clear()
-    activities.update(original_activities)
+    assert _matches_template(), "activities drifted from the template during the run"
+
+
+@pytest.fixture(autouse=True)
+def reset_activities(request, tracked_activities):
+    """Undo the changes a test made to activities
+
+    Only activities whose participants recorded a mutation are rebuilt,
+    and tests marked ``readonly`` skip the restore entirely.
+    """
+    yield
+    if request.node.get_closest_marker("readonly") is None:
+        _restore_activities(_touched)
+        _touched.clear()
+
+
+def snapshot(*names):
+    """Return a copy of the participant lists for the given activities"""
+    return {name: list(activities[name]["participants"]) for name in names}
+
+
+async def asgi_call(method, path, params=None):
+    """Invoke the ASGI app directly and return ``(status, body)``
+
+    The request is built as a bare HTTP scope, skipping httpx's URL
+    handling and response objects entirely. Tests using it should request
+    the ``lifespan`` fixture so the scope carries the lifespan state.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": unquote(path),
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(params or {}).encode(),
+        "headers": [(b"host", b"test")],
+        "server": ("test", 80),
+        "state": dict(_lifespan_state),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    assert messages and messages[0]["type"] == "http.response.start", (
+        f"{method} {path} sent no response start: {messages!r}"
+    )
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return messages[0]["status"], body
+
+
+async def get_participants(client, name):
+    """Fetch GET /activities once and return the participants of one activity"""
+    response = await client.get("/activities")
+    return orjson.loads(response.content)[name]["participants"]
 
 
 class TestRootEndpoint:
     """Tests for the root endpoint"""
     
-    def test_root_redirects_to_index(self, client):
+    @pytest.mark.readonly
+    async def test_root_redirects_to_index(self, client):
         """Test that root path redirects to static index.html"""
-        response = client.get("/", follow_redirects=False)
+        response = await client.get("/", follow_redirects=False)
         assert response.status_code == 307
         assert response.headers["location"] == "/static/index.html"
 
@@ -98,24 +274,26 @@ class TestRootEndpoint:
 class TestGetActivities:
     """Tests for GET /activities endpoint"""
     
-    def test_get_activities_returns_all_activities(self, client):
+    @pytest.mark.readonly
+    async def test_get_activities_returns_all_activities(self, client):
         """Test that GET /activities returns all activities"""
-        response = client.get("/activities")
+        response = await client.get("/activities")
         assert response.status_code == 200
         
-        data = response.json()
+        data = orjson.loads(response.content)
         assert isinstance(data, dict)
         assert len(data) == 9
-        assert "Soccer Team" in data
-        assert "Basketball Club" in data
-        assert "Programming Class" in data
+        assert ACT_SOCCER in data
+        assert ACT_BASKETBALL in data
+        assert ACT_PROGRAMMING in data
     
-    def test_get_activities_includes_correct_fields(self, client):
+    @pytest.mark.readonly
+    async def test_get_activities_includes_correct_fields(self, client):
         """Test that activities have all required fields"""
-        response = client.get("/activities")
-        data = response.json()
+        response = await client.get("/activities")
+        data = orjson.loads(response.content)
         
-        soccer = data["Soccer Team"]
+        soccer = data[ACT_SOCCER]
         assert "description" in soccer
         assert "schedule" in soccer
         assert "max_participants" in soccer
@@ -127,145 +305,143 @@ class TestGetActivities:
 class TestSignupActivity:
     """Tests for POST /activities/{activity_name}/signup endpoint"""
     
-    def test_signup_new_student_success(self, client):
+    async def test_signup_new_student_success(self, client):
         """Test successful signup for a new student"""
-        response = client.post(
-            "/activities/Soccer Team/signup?email=test@mergington.edu"
+        response = await client.post(
+            SIGNUP[ACT_SOCCER], params={"email": "test@mergington.edu"}
         )
         assert response.status_code == 200
         
-        data = response.json()
+        data = orjson.loads(response.content)
         assert "message" in data
         assert "test@mergington.edu" in data["message"]
-        assert "Soccer Team" in data["message"]
+        assert ACT_SOCCER in data["message"]
         
         # Verify student was added
-        activities_response = client.get("/activities")
-        activities_data = activities_response.json()
-        assert "test@mergington.edu" in activities_data["Soccer Team"]["participants"]
+        assert "test@mergington.edu" in activities[ACT_SOCCER]["participants"]
     
-    def test_signup_duplicate_student_fails(self, client):
+    @pytest.mark.parametrize("email, presign", [
+        pytest.param(EMAIL_ALEX, False, id="already-in-template"),
+        pytest.param("new@mergington.edu", True, id="just-signed-up"),
+    ])
+    def test_signup_duplicate_student_fails(self, email, presign):
         """Test that signing up an already registered student fails"""
-        # First signup
-        client.post("/activities/Soccer Team/signup?email=new@mergington.edu")
+        if presign:
+            # First signup
+            signup_for_activity(ACT_SOCCER, email)
+        else:
+            # The student must already be an initial participant
+            assert email in activities[ACT_SOCCER]["participants"]
         
         # Try to signup again
-        response = client.post(
-            "/activities/Soccer Team/signup?email=new@mergington.edu"
-        )
-        assert response.status_code == 400
-        assert "already signed up" in response.json()["detail"].lower()
-    
-    def test_signup_nonexistent_activity_fails(self, client):
-        """Test that signing up for a non-existent activity fails"""
-        response = client.post(
-            "/activities/Fake Activity/signup?email=test@mergington.edu"
-        )
-        assert response.status_code == 404
-        assert "not found" in response.json()["detail"].lower()
-    
-    def test_signup_existing_student_fails(self, client):
-        """Test that an existing participant cannot sign up again"""
-        response = client.post(
-            "/activities/Soccer Team/signup?email=alex@mergington.edu"
-        )
-        assert response.status_code == 400
+        with pytest.raises(HTTPException) as exc_info:
+            signup_for_activity(ACT_SOCCER, email)
+        assert exc_info.value.status_code == 400
+        assert "already signed up" in exc_info.value.detail.lower()
 
 
 class TestUnregisterActivity:
     """Tests for DELETE /activities/{activity_name}/unregister endpoint"""
     
-    def test_unregister_existing_student_success(self, client):
+    async def test_unregister_existing_student_success(self, client):
         """Test successful unregistration of an existing student"""
-        response = client.delete(
-            "/activities/Soccer Team/unregister?email=alex@mergington.edu"
+        response = await client.delete(
+            UNREGISTER[ACT_SOCCER], params={"email": EMAIL_ALEX}
         )
         assert response.status_code == 200
         
-        data = response.json()
+        data = orjson.loads(response.content)
         assert "message" in data
-        assert "alex@mergington.edu" in data["message"]
-        assert "Soccer Team" in data["message"]
+        assert EMAIL_ALEX in data["message"]
+        assert ACT_SOCCER in data["message"]
         
         # Verify student was removed
-        activities_response = client.get("/activities")
-        activities_data = activities_response.json()
-        assert "alex@mergington.edu" not in activities_data["Soccer Team"]["participants"]
+        assert EMAIL_ALEX not in activities[ACT_SOCCER]["participants"]
     
-    def test_unregister_non_registered_student_fails(self, client):
+    def test_unregister_non_registered_student_fails(self):
         """Test that unregistering a non-registered student fails"""
-        response = client.delete(
-            "/activities/Soccer Team/unregister?email=notregistered@mergington.edu"
-        )
-        assert response.status_code == 400
-        assert "not registered" in response.json()["detail"].lower()
+        with pytest.raises(HTTPException) as exc_info:
+            unregister_from_activity(ACT_SOCCER, "notregistered@mergington.edu")
+        assert exc_info.value.status_code == 400
+        assert "not registered" in exc_info.value.detail.lower()
     
-    def test_unregister_nonexistent_activity_fails(self, client):
-        """Test that unregistering from a non-existent activity fails"""
-        response = client.delete(
-            "/activities/Fake Activity/unregister?email=test@mergington.edu"
-        )
-        assert response.status_code == 404
-        assert "not found" in response.json()["detail"].lower()
-    
-    def test_unregister_after_signup(self, client):
+    async def test_unregister_after_signup(self, client):
         """Test that a student can be unregistered after signing up"""
         # Sign up
-        signup_response = client.post(
-            "/activities/Chess Club/signup?email=newstudent@mergington.edu"
+        status, _ = await asgi_call(
+            "POST", SIGNUP[ACT_CHESS], {"email": "newstudent@mergington.edu"}
         )
-        assert signup_response.status_code == 200
+        assert status == 200
         
         # Unregister
-        unregister_response = client.delete(
-            "/activities/Chess Club/unregister?email=newstudent@mergington.edu"
+        status, _ = await asgi_call(
+            "DELETE", UNREGISTER[ACT_CHESS], {"email": "newstudent@mergington.edu"}
         )
-        assert unregister_response.status_code == 200
+        assert status == 200
         
         # Verify student is removed
-        activities_response = client.get("/activities")
-        activities_data = activities_response.json()
-        assert "newstudent@mergington.edu" not in activities_data["Chess Club"]["participants"]
+        participants = await get_participants(client, ACT_CHESS)
+        assert "newstudent@mergington.edu" not in participants
+
+
+class TestNonexistentActivity:
+    """Tests for signup and unregister requests naming an unknown activity"""
+    
+    @pytest.mark.parametrize("method, path", [
+        ("POST", "/activities/Fake%20Activity/signup"),
+        ("DELETE", "/activities/Fake%20Activity/unregister"),
+    ])
+    async def test_nonexistent_activity_fails(self, client, method, path):
+        """Test that signing up for or unregistering from a non-existent activity fails"""
+        response = await client.request(
+            method, path, params={"email": "test@mergington.edu"}
+        )
+        assert response.status_code == 404
+        assert "not found" in orjson.loads(response.content)["detail"].lower()
 
 
 class TestActivityWorkflows:
     """Integration tests for complete workflows"""
     
-    def test_multiple_signups_and_unregistrations(self, client):
+    async def test_multiple_signups_and_unregistrations(self, lifespan):
         """Test multiple signups and unregistrations"""
         # Sign up multiple students
-        client.post("/activities/Art Club/signup?email=student1@mergington.edu")
-        client.post("/activities/Art Club/signup?email=student2@mergington.edu")
-        client.post("/activities/Art Club/signup?email=student3@mergington.edu")
+        results = await asyncio.gather(
+            asgi_call("POST", SIGNUP[ACT_ART], {"email": "student1@mergington.edu"}),
+            asgi_call("POST", SIGNUP[ACT_ART], {"email": "student2@mergington.edu"}),
+            asgi_call("POST", SIGNUP[ACT_ART], {"email": "student3@mergington.edu"}),
+        )
+        assert [status for status, _ in results] == [200, 200, 200]
         
         # Check all were added
-        activities_response = client.get("/activities")
-        participants = activities_response.json()["Art Club"]["participants"]
+        participants = snapshot(ACT_ART)[ACT_ART]
         assert "student1@mergington.edu" in participants
         assert "student2@mergington.edu" in participants
         assert "student3@mergington.edu" in participants
         assert len(participants) == 5  # 2 original + 3 new
         
         # Unregister one
-        client.delete("/activities/Art Club/unregister?email=student2@mergington.edu")
+        status, _ = await asgi_call(
+            "DELETE", UNREGISTER[ACT_ART], {"email": "student2@mergington.edu"}
+        )
+        assert status == 200
         
         # Verify removal
-        activities_response = client.get("/activities")
-        participants = activities_response.json()["Art Club"]["participants"]
+        participants = snapshot(ACT_ART)[ACT_ART]
         assert "student2@mergington.edu" not in participants
         assert len(participants) == 4
     
-    def test_signup_to_multiple_activities(self, client):
+    async def test_signup_to_multiple_activities(self, client):
         """Test that a student can sign up for multiple activities"""
         email = "multisport@mergington.edu"
         
-        client.post(f"/activities/Soccer Team/signup?email={email}")
-        client.post(f"/activities/Basketball Club/signup?email={email}")
-        client.post(f"/activities/Chess Club/signup?email={email}")
-        
-        activities_response = client.get("/activities")
-        activities_data = activities_response.json()
+        responses = await asyncio.gather(
+            client.post(SIGNUP[ACT_SOCCER], params={"email": email}),
+            client.post(SIGNUP[ACT_BASKETBALL], params={"email": email}),
+            client.post(SIGNUP[ACT_CHESS], params={"email": email}),
+        )
+        assert [response.status_code for response in responses] == [200, 200, 200]
         
-        assert email in activities_data["Soccer Team"]["participants"]
-        assert email in activities_data["Basketball Club"]["participants"]
-        assert email in activities_data["Chess Club"]["participants"]
+        assert email in activities[ACT_SOCCER]["participants"]
+        assert email in activities[ACT_BASKETBALL]["participants"]
+        assert email in activities[ACT_CHESS]["participants"]